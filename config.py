@@ -4,9 +4,9 @@ Reads settings from environment variables or .env file.
 """
 import os
 from pathlib import Path
-from functools import lru_cache
+from functools import cached_property, lru_cache
 from pydantic_settings import BaseSettings
-from typing import List
+from typing import Tuple
 
 
 # Find the .env file - check backend dir first, then parent (for local dev)
@@ -41,6 +41,10 @@ class Settings(BaseSettings):
     # Admin
     admin_api_key: str = "change-this-key"
 
+    # CORS - set to False when the edge proxy (Railway/Nginx/Caddy) answers
+    # preflights itself, so the Python middleware isn't even instantiated
+    cors_middleware_enabled: bool = True
+
     # CORS - includes Railway frontend domain for production
     # Allow all Railway subdomains and localhost for development
     cors_origins: str = "http://localhost:3000,http://localhost:5173,http://127.0.0.1:3000,http://127.0.0.1:5173,https://nft-municipal-flag-game-frontend-production.up.railway.app,https://*.up.railway.app"
@@ -79,10 +83,14 @@ class Settings(BaseSettings):
     react_app_api_url: str = "http://localhost:8000/api"
     react_app_ipfs_gateway: str = "https://gateway.pinata.cloud/ipfs"
 
-    @property
-    def cors_origins_list(self) -> List[str]:
-        """Parse CORS origins from comma-separated string."""
-        return [origin.strip() for origin in self.cors_origins.split(",")]
+    @cached_property
+    def cors_origins_list(self) -> Tuple[str, ...]:
+        """Parse CORS origins from comma-separated string.
+
+        Parsed once and frozen as a tuple so repeated startups (e.g.
+        under --reload) don't re-split the env string.
+        """
+        return tuple(origin.strip() for origin in self.cors_origins.split(","))
 
     class Config:
         env_file = str(ENV_FILE) if ENV_FILE else None
@@ -9,13 +9,26 @@ from config import settings
 # Create engine based on database URL from .env
 # For SQLite, we need check_same_thread=False for FastAPI
 connect_args = {}
+engine_kwargs = {}
 if settings.database_url.startswith("sqlite"):
     connect_args = {"check_same_thread": False}
+else:
+    # Postgres (Railway): size the pool explicitly so concurrent admin
+    # calls don't starve for connections, pre-ping to replace connections
+    # the proxy silently dropped, and recycle before idle timeouts hit
+    engine_kwargs = {
+        "pool_size": 20,
+        "max_overflow": 10,
+        "pool_timeout": 30,
+        "pool_pre_ping": True,
+        "pool_recycle": 1800,
+    }
 
 engine = create_engine(
     settings.database_url,
     connect_args=connect_args,
-    echo=settings.debug  # Log SQL queries in debug mode
+    echo=settings.debug,  # Log SQL queries in debug mode
+    **engine_kwargs
 )
 
 # Session factory
@@ -4,7 +4,14 @@ Municipal Flag NFT Game - Backend API
 Main FastAPI application entry point.
 """
 # Updated to support IPFS import endpoints
-from fastapi import FastAPI
+import asyncio
+import json
+import logging
+from contextlib import asynccontextmanager
+
+import anyio
+import httpx
+from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
 
 from config import settings
@@ -20,41 +27,18 @@ from routers import (
     admin_router
 )
 
-# Initialize FastAPI app
-app = FastAPI(
-    title=settings.project_name,
-    description="A web game based on NFTs where players collect flags of real municipalities.",
-    version="1.0.0",
-    docs_url="/docs",
-    redoc_url="/redoc"
-)
 
-# Configure CORS - Allow all origins for Railway deployment
-# In production, Railway uses dynamic subdomains that need flexible CORS
-cors_origins = settings.cors_origins_list
-
-# Check if we should allow all origins (when wildcard pattern is present)
-allow_all_origins = any("*" in origin for origin in cors_origins)
-
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"] if allow_all_origins else cors_origins,
-    allow_credentials=not allow_all_origins,  # Cannot use credentials with "*"
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+# Buffered, machine-parseable startup logs instead of print() (which
+# forces a write syscall per line under Railway's unbuffered stdout)
+logger = logging.getLogger("app.startup")
 
 
 # =============================================================================
-# STARTUP EVENTS
+# LIFESPAN (startup / shutdown)
 # =============================================================================
 
-@app.on_event("startup")
-async def startup_event():
-    """Initialize database on startup and seed if empty."""
-    init_db()
-
-    # Run database migrations for new columns
+def _run_startup_migrations():
+    """Run database migrations for new columns."""
     from database import engine
     from sqlalchemy import text, inspect
 
@@ -65,41 +49,178 @@ async def startup_event():
         if 'flags' in inspector.get_table_names():
             columns = [col['name'] for col in inspector.get_columns('flags')]
             if 'nfts_required' not in columns:
-                print("📦 Adding 'nfts_required' column to flags table...")
+                logger.info("Adding 'nfts_required' column to flags table...")
                 try:
                     conn.execute(text("ALTER TABLE flags ADD COLUMN nfts_required INTEGER DEFAULT 1 NOT NULL"))
                     conn.commit()
-                    print("✅ Column 'nfts_required' added successfully!")
+                    logger.info("Column 'nfts_required' added successfully")
                 except Exception as e:
-                    print(f"⚠️ Could not add column (may already exist): {e}")
+                    logger.warning("Could not add column (may already exist): %s", e)
+
+            # Partial indexes so the /ipfs-status counts become index-only
+            # scans instead of seq scans over the whole flags table
+            # (supported by both PostgreSQL and SQLite)
+            try:
+                conn.execute(text(
+                    "CREATE INDEX IF NOT EXISTS flags_image_hash_set_idx "
+                    "ON flags (id) WHERE image_ipfs_hash IS NOT NULL"
+                ))
+                conn.execute(text(
+                    "CREATE INDEX IF NOT EXISTS flags_metadata_hash_set_idx "
+                    "ON flags (id) WHERE metadata_ipfs_hash IS NOT NULL"
+                ))
+                conn.commit()
+            except Exception as e:
+                logger.warning("Could not create IPFS hash indexes: %s", e)
 
-    # Auto-seed database if empty (for Railway deployment)
-    from database import SessionLocal
+
+def _seed_if_empty():
+    """Seed the database with demo data if it's empty (Railway deployment)."""
+    from database import SessionLocal, engine
+    from sqlalchemy import text
     from models import Country
-    db = SessionLocal()
-    try:
-        existing = db.query(Country).count()
-        if existing == 0:
-            print("📦 Database is empty, seeding with demo data...")
-            from seed_data import seed_database
-            seed_database(db)
-    finally:
-        db.close()
+    from seed_data import SEED_LOCK_KEY, seed_database, seed_lock
+
+    # The in-process lock is shared with the admin /seed endpoint so the
+    # two paths can't both pass the emptiness probe and double-seed
+    with seed_lock:
+        # On Postgres, also take an advisory lock so only one worker seeds.
+        # The lock lives on a dedicated connection held open for the whole
+        # seed: the Session returns its connection to the pool on every
+        # commit, so locking through the session would release the lock on
+        # one connection and try to unlock on another, leaking it.
+        is_postgres = engine.dialect.name == "postgresql"
+        lock_conn = None
+        if is_postgres:
+            lock_conn = engine.connect()
+            got_lock = lock_conn.execute(
+                text("SELECT pg_try_advisory_lock(:key)"), {"key": SEED_LOCK_KEY}
+            ).scalar()
+            if not got_lock:
+                lock_conn.close()
+                return
+        try:
+            db = SessionLocal()
+            try:
+                # EXISTS-style probe: fetch one row instead of counting the table
+                has_data = db.query(Country.id).first() is not None
+                if not has_data:
+                    logger.info("Database is empty, seeding with demo data...")
+                    seed_database(db)
+            except Exception:
+                # Clear the failed transaction so the original error
+                # surfaces instead of a PendingRollbackError
+                db.rollback()
+                raise
+            finally:
+                db.close()
+        finally:
+            if lock_conn is not None:
+                lock_conn.execute(
+                    text("SELECT pg_advisory_unlock(:key)"), {"key": SEED_LOCK_KEY}
+                )
+                lock_conn.close()
+
+
+async def _seed_in_background():
+    """Run the (sync) seed check in a worker thread off the event loop."""
+    await anyio.to_thread.run_sync(_seed_if_empty)
+
+
+def _report_seed_result(task: asyncio.Task):
+    """Log a failed seed task - it runs detached, so nothing awaits it."""
+    if not task.cancelled() and task.exception() is not None:
+        logger.error("Background seeding failed", exc_info=task.exception())
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Initialize database on startup and seed if empty."""
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s %(levelname)s %(name)s %(message)s"
+    )
+
+    init_db()
+    _run_startup_migrations()
+
+    # Seed in the background so the server accepts traffic (and passes
+    # health probes) immediately instead of blocking on a potentially
+    # long seeding run
+    seed_task = asyncio.create_task(_seed_in_background())
+    seed_task.add_done_callback(_report_seed_result)
 
-    print(f"🚀 {settings.project_name} API started!")
-    print(f"📝 Environment: {settings.environment}")
-    print(f"📚 API Docs available at /docs")
+    # Shared HTTP client for outbound calls (Pinata sync) so connections
+    # are kept alive across requests instead of re-handshaking each time
+    app.state.http = httpx.AsyncClient(
+        timeout=30.0,
+        limits=httpx.Limits(max_connections=10)
+    )
+
+    # One record (one write) instead of three separate prints
+    logger.info(
+        "%s API started env=%s docs=/docs",
+        settings.project_name, settings.environment
+    )
+
+    yield
+
+    if not seed_task.done():
+        try:
+            await seed_task
+        except Exception:
+            pass  # already logged by the done callback
+    await app.state.http.aclose()
+
+
+# Initialize FastAPI app
+app = FastAPI(
+    title=settings.project_name,
+    description="A web game based on NFTs where players collect flags of real municipalities.",
+    version="1.0.0",
+    docs_url="/docs",
+    redoc_url="/redoc",
+    lifespan=lifespan
+)
+
+# Configure CORS - Allow all origins for Railway deployment
+# In production, Railway uses dynamic subdomains that need flexible CORS
+#
+# When a front proxy answers OPTIONS preflights at the edge (e.g. nginx:
+#   if ($request_method = OPTIONS) { return 204; } with the CORS headers),
+# set CORS_MIDDLEWARE_ENABLED=false so preflights never reach the Python
+# worker and the middleware is skipped entirely on every request.
+if settings.cors_middleware_enabled:
+    cors_origins = settings.cors_origins_list
+
+    # Check if we should allow all origins (when wildcard pattern is present)
+    allow_all_origins = any("*" in origin for origin in cors_origins)
+
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=("*",) if allow_all_origins else cors_origins,
+        allow_credentials=not allow_all_origins,  # Cannot use credentials with "*"
+        allow_methods=["*"],
+        allow_headers=["*"],
+    )
 
 
 # =============================================================================
 # ROUTES
 # =============================================================================
 
-# Health check
-@app.get("/health", tags=["Health"])
+# Health check - serialized once at import so probes skip dict building
+# and JSON encoding entirely; hidden from the OpenAPI schema
+_HEALTH_RESPONSE = Response(
+    json.dumps({"status": "ok", "project": settings.project_name}).encode(),
+    media_type="application/json"
+)
+
+
+@app.get("/health", tags=["Health"], include_in_schema=False)
 def health_check():
     """Health check endpoint."""
-    return {"status": "ok", "project": settings.project_name}
+    return _HEALTH_RESPONSE
 
 
 # API routers
@@ -117,10 +238,10 @@ app.include_router(admin_router, prefix="/api/admin")
 # ROOT ENDPOINT
 # =============================================================================
 
-@app.get("/", tags=["Root"])
-def root():
-    """Root endpoint with API information."""
-    return {
+# The root payload only depends on settings fixed at startup, so it is
+# serialized once at import like the health responses
+_ROOT_RESPONSE = Response(
+    json.dumps({
         "name": settings.project_name,
         "version": "1.0.0",
         "description": "Municipal Flag NFT Game API",
@@ -136,7 +257,15 @@ def root():
             "rankings": "/api/rankings",
             "admin": "/api/admin"
         }
-    }
+    }).encode(),
+    media_type="application/json"
+)
+
+
+@app.get("/", tags=["Root"], response_class=Response)
+def root():
+    """Root endpoint with API information."""
+    return _ROOT_RESPONSE
 
 
 # =============================================================================
@@ -2,11 +2,15 @@
 Admin API Router.
 """
 import re
-import httpx
+import json
+import hmac
+import asyncio
+import anyio
+import orjson
 from typing import Optional
-from fastapi import APIRouter, Depends, HTTPException, status, Header
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status, Header
 from sqlalchemy.orm import Session
-from sqlalchemy import func
+from sqlalchemy import func, select, text
 
 from database import get_db
 from models import (
@@ -18,10 +22,29 @@ from config import settings
 
 router = APIRouter(tags=["Admin"])
 
+# Pinata pin list API
+PINATA_PIN_LIST_URL = "https://api.pinata.cloud/data/pinList"
+PINATA_PAGE_LIMIT = 1000
+
+# Pinata filename patterns, compiled once instead of per pin in the sync loop
+_IMAGE_RE = re.compile(r"^[A-Z]{3}_[a-z]+_(\d+)\.png$")
+_IMAGE_FALLBACK_RE = re.compile(r"^flag_(\d+)\.png$")
+_METADATA_RE = re.compile(r"^flag_(\d+)_metadata\.json$")
+
+
+# Admin key cached as bytes at import; compared with hmac.compare_digest
+# so the check is constant-time (no timing side-channel) and skips the
+# settings attribute lookup on every request
+_ADMIN_KEY = (settings.admin_api_key or "").encode()
+
 
 def verify_admin(x_admin_key: Optional[str] = Header(None)):
     """Verify admin API key for protected endpoints."""
-    if x_admin_key != settings.admin_api_key:
+    if (
+        not _ADMIN_KEY
+        or not x_admin_key
+        or not hmac.compare_digest(x_admin_key.encode(), _ADMIN_KEY)
+    ):
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Invalid or missing admin API key"
@@ -35,32 +58,36 @@ def get_admin_stats(
     _: bool = Depends(verify_admin)
 ):
     """Get overall statistics for the admin panel."""
-    total_countries = db.query(func.count(Country.id)).scalar()
-    total_regions = db.query(func.count(Region.id)).scalar()
-    total_municipalities = db.query(func.count(Municipality.id)).scalar()
-    total_flags = db.query(func.count(Flag.id)).scalar()
-    total_users = db.query(func.count(User.id)).scalar()
-    total_interests = db.query(func.count(FlagInterest.id)).scalar()
-    total_ownerships = db.query(func.count(FlagOwnership.id)).scalar()
-    total_auctions = db.query(func.count(Auction.id)).scalar()
-    active_auctions = db.query(func.count(Auction.id)).filter(
-        Auction.status == AuctionStatus.ACTIVE
-    ).scalar()
-    completed_pairs = db.query(func.count(Flag.id)).filter(
-        Flag.is_pair_complete == True
-    ).scalar()
+    # Single round-trip: each count runs as a scalar subquery in one SELECT
+    stmt = select(
+        select(func.count(Country.id)).scalar_subquery().label("total_countries"),
+        select(func.count(Region.id)).scalar_subquery().label("total_regions"),
+        select(func.count(Municipality.id)).scalar_subquery().label("total_municipalities"),
+        select(func.count(Flag.id)).scalar_subquery().label("total_flags"),
+        select(func.count(User.id)).scalar_subquery().label("total_users"),
+        select(func.count(FlagInterest.id)).scalar_subquery().label("total_interests"),
+        select(func.count(FlagOwnership.id)).scalar_subquery().label("total_ownerships"),
+        select(func.count(Auction.id)).scalar_subquery().label("total_auctions"),
+        select(func.count(Auction.id)).where(
+            Auction.status == AuctionStatus.ACTIVE
+        ).scalar_subquery().label("active_auctions"),
+        select(func.count(Flag.id)).where(
+            Flag.is_pair_complete == True
+        ).scalar_subquery().label("completed_pairs"),
+    )
+    row = db.execute(stmt).one()
 
     return AdminStatsResponse(
-        total_countries=total_countries or 0,
-        total_regions=total_regions or 0,
-        total_municipalities=total_municipalities or 0,
-        total_flags=total_flags or 0,
-        total_users=total_users or 0,
-        total_interests=total_interests or 0,
-        total_ownerships=total_ownerships or 0,
-        total_auctions=total_auctions or 0,
-        active_auctions=active_auctions or 0,
-        completed_pairs=completed_pairs or 0
+        total_countries=row.total_countries or 0,
+        total_regions=row.total_regions or 0,
+        total_municipalities=row.total_municipalities or 0,
+        total_flags=row.total_flags or 0,
+        total_users=row.total_users or 0,
+        total_interests=row.total_interests or 0,
+        total_ownerships=row.total_ownerships or 0,
+        total_auctions=row.total_auctions or 0,
+        active_auctions=row.active_auctions or 0,
+        completed_pairs=row.completed_pairs or 0
     )
 
 
@@ -70,17 +97,58 @@ def seed_demo_data(
     _: bool = Depends(verify_admin)
 ):
     """Seed the database with demo data (only if empty)."""
-    # Check if data already exists
-    existing_countries = db.query(Country).count()
-    if existing_countries > 0:
+    # Same locks as the startup seeder so a request arriving while that
+    # task is mid-run can't pass the emptiness probe and double-seed
+    from seed_data import SEED_LOCK_KEY, seed_database, seed_lock
+
+    if not seed_lock.acquire(blocking=False):
         raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Database already has data. Cannot seed."
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Seeding already in progress"
         )
-
-    # Import seed function
-    from seed_data import seed_database
-    seed_database(db)
+    try:
+        # On Postgres the advisory lock lives on a dedicated connection
+        # held open for the whole seed: seed_database commits, which
+        # returns the session's connection to the pool, so an unlock
+        # issued through the session could land on a different connection
+        # and leak the lock (leaving /seed answering 409 indefinitely).
+        engine = db.get_bind()
+        lock_conn = None
+        if engine.dialect.name == "postgresql":
+            lock_conn = engine.connect()
+            got_lock = lock_conn.execute(
+                text("SELECT pg_try_advisory_lock(:key)"), {"key": SEED_LOCK_KEY}
+            ).scalar()
+            if not got_lock:
+                lock_conn.close()
+                lock_conn = None
+                raise HTTPException(
+                    status_code=status.HTTP_409_CONFLICT,
+                    detail="Seeding already in progress"
+                )
+        try:
+            # Check if data already exists (one-row probe, no full count)
+            if db.query(Country.id).first() is not None:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail="Database already has data. Cannot seed."
+                )
+
+            try:
+                seed_database(db)
+            except Exception:
+                # Clear the failed transaction so the original error
+                # surfaces instead of a PendingRollbackError
+                db.rollback()
+                raise
+        finally:
+            if lock_conn is not None:
+                lock_conn.execute(
+                    text("SELECT pg_advisory_unlock(:key)"), {"key": SEED_LOCK_KEY}
+                )
+                lock_conn.close()
+    finally:
+        seed_lock.release()
 
     return MessageResponse(message="Demo data seeded successfully")
 
@@ -91,31 +159,47 @@ def reset_database(
     _: bool = Depends(verify_admin)
 ):
     """Reset the database (delete all data). USE WITH CAUTION."""
-    # Delete in correct order to respect foreign keys
-    db.query(FlagInterest).delete()
-    db.query(FlagOwnership).delete()
-    from models import Bid, UserConnection
-    db.query(Bid).delete()
-    db.query(Auction).delete()
-    db.query(UserConnection).delete()
-    db.query(User).delete()
-    db.query(Flag).delete()
-    db.query(Municipality).delete()
-    db.query(Region).delete()
-    db.query(Country).delete()
+    if db.get_bind().dialect.name == "postgresql":
+        # One TRUNCATE wipes every table, skips per-row WAL and resets
+        # the id sequences - much faster than row-by-row DELETEs
+        db.execute(text(
+            "TRUNCATE flag_interests, flag_ownerships, bids, auctions, "
+            "user_connections, users, flags, municipalities, regions, "
+            "countries RESTART IDENTITY CASCADE"
+        ))
+    else:
+        # SQLite has no TRUNCATE; delete in correct order to respect foreign keys
+        db.query(FlagInterest).delete()
+        db.query(FlagOwnership).delete()
+        from models import Bid, UserConnection
+        db.query(Bid).delete()
+        db.query(Auction).delete()
+        db.query(UserConnection).delete()
+        db.query(User).delete()
+        db.query(Flag).delete()
+        db.query(Municipality).delete()
+        db.query(Region).delete()
+        db.query(Country).delete()
     db.commit()
 
     return MessageResponse(message="Database reset successfully")
 
 
-@router.get("/health")
-def health_check():
-    """Simple health check endpoint."""
-    return {
+# Serialized once at import - the payload only depends on startup settings
+_HEALTH_RESPONSE = Response(
+    json.dumps({
         "status": "healthy",
         "project": settings.project_name,
         "environment": settings.environment
-    }
+    }).encode(),
+    media_type="application/json"
+)
+
+
+@router.get("/health", include_in_schema=False)
+def health_check():
+    """Simple health check endpoint."""
+    return _HEALTH_RESPONSE
 
 
 @router.get("/ipfs-status")
@@ -124,13 +208,23 @@ def ipfs_status(
     _: bool = Depends(verify_admin)
 ):
     """Get IPFS upload status for all flags."""
-    total_flags = db.query(func.count(Flag.id)).scalar() or 0
-    flags_with_image = db.query(func.count(Flag.id)).filter(
-        Flag.image_ipfs_hash.isnot(None)
-    ).scalar() or 0
-    flags_with_metadata = db.query(func.count(Flag.id)).filter(
-        Flag.metadata_ipfs_hash.isnot(None)
-    ).scalar() or 0
+    # Still one round-trip, but each count is its own scalar subquery so
+    # the planner can serve the two IS NOT NULL counts from the partial
+    # indexes instead of folding everything into one full-table scan
+    row = db.execute(
+        select(
+            select(func.count(Flag.id)).scalar_subquery().label("total_flags"),
+            select(func.count(Flag.id)).where(
+                Flag.image_ipfs_hash.isnot(None)
+            ).scalar_subquery().label("flags_with_image"),
+            select(func.count(Flag.id)).where(
+                Flag.metadata_ipfs_hash.isnot(None)
+            ).scalar_subquery().label("flags_with_metadata"),
+        )
+    ).one()
+    total_flags = row.total_flags or 0
+    flags_with_image = row.flags_with_image or 0
+    flags_with_metadata = row.flags_with_metadata or 0
 
     return {
         "total_flags": total_flags,
@@ -140,8 +234,121 @@ def ipfs_status(
     }
 
 
+def _classify_pins(pins, image_map, image_map_fallback, metadata_map):
+    """Sort a page of Pinata pins into the flag_id -> ipfs_hash maps.
+
+    Single hot loop: one prefix check, at most two regex matches and one
+    dict insert per pin, with no intermediate structures retained.
+    """
+    for pin in pins:
+        pin_metadata = pin.get("metadata", {})
+        name = pin_metadata.get("name", "")
+        ipfs_hash = pin.get("ipfs_pin_hash")
+
+        if not name or not ipfs_hash:
+            continue
+
+        # Cheap prefix dispatch: the "flag_" patterns and the country-code
+        # pattern are disjoint, so pick the right regex family up front
+        # instead of trying every pattern in turn.
+        if name.startswith("flag_"):
+            # Match metadata files: flag_{id}_metadata.json
+            match = _METADATA_RE.match(name)
+            if match:
+                metadata_map[int(match.group(1))] = ipfs_hash
+                continue
+
+            # Match FALLBACK: flag_{id}.png format (lower priority)
+            match = _IMAGE_FALLBACK_RE.match(name)
+            if match:
+                image_map_fallback[int(match.group(1))] = ipfs_hash
+            continue
+
+        # Match PRIMARY image files: {COUNTRY_CODE}_{municipality}_{flag_id}.png
+        # e.g., ITA_siena_064.png, ESP_barcelona_001.png - the number is the flag ID
+        match = _IMAGE_RE.match(name)
+        if match:
+            image_map[int(match.group(1))] = ipfs_hash
+
+
+def _apply_ipfs_updates(db: Session, image_map: dict, metadata_map: dict) -> int:
+    """Compare and apply IPFS hashes for flags present in the given maps.
+
+    Synchronous DB work, meant to be called via anyio.to_thread.run_sync
+    from the async sync endpoint. Returns the number of updated flags.
+    """
+    # Only fetch the id + hash columns for flags Pinata actually knows about,
+    # instead of hydrating every Flag row just to compare two fields.
+    # Chunk the IN clause so huge pin sets don't blow up the query parser.
+    candidate_ids = list(image_map.keys() | metadata_map.keys())
+    rows = []
+    for i in range(0, len(candidate_ids), 1000):
+        rows.extend(
+            db.query(Flag.id, Flag.image_ipfs_hash, Flag.metadata_ipfs_hash)
+            .filter(Flag.id.in_(candidate_ids[i:i + 1000]))
+            .all()
+        )
+
+    # Collect changed hashes and apply them in one bulk UPDATE instead of
+    # mutating ORM instances (which flushes one UPDATE per flag on commit)
+    updates = []
+    for flag_id, current_image_hash, current_metadata_hash in rows:
+        # Find matching image and metadata by flag ID
+        image_hash = image_map.get(flag_id)
+        metadata_hash = metadata_map.get(flag_id)
+
+        update = {"id": flag_id}
+        if image_hash and current_image_hash != image_hash:
+            update["image_ipfs_hash"] = image_hash
+        if metadata_hash and current_metadata_hash != metadata_hash:
+            update["metadata_ipfs_hash"] = metadata_hash
+
+        if len(update) > 1:
+            updates.append(update)
+
+    if updates:
+        if db.get_bind().dialect.name == "postgresql":
+            # psycopg2's execute_values pages the pairs through a single
+            # UPDATE ... FROM (VALUES ...) per batch instead of one bind
+            # set per row
+            from psycopg2.extras import execute_values
+
+            image_rows = [
+                (u["id"], u["image_ipfs_hash"])
+                for u in updates if "image_ipfs_hash" in u
+            ]
+            metadata_rows = [
+                (u["id"], u["metadata_ipfs_hash"])
+                for u in updates if "metadata_ipfs_hash" in u
+            ]
+            raw_conn = db.connection().connection
+            with raw_conn.cursor() as cur:
+                if image_rows:
+                    execute_values(
+                        cur,
+                        "UPDATE flags SET image_ipfs_hash = v.h "
+                        "FROM (VALUES %s) AS v(id, h) WHERE flags.id = v.id",
+                        image_rows,
+                        page_size=1000
+                    )
+                if metadata_rows:
+                    execute_values(
+                        cur,
+                        "UPDATE flags SET metadata_ipfs_hash = v.h "
+                        "FROM (VALUES %s) AS v(id, h) WHERE flags.id = v.id",
+                        metadata_rows,
+                        page_size=1000
+                    )
+        else:
+            db.bulk_update_mappings(Flag, updates)
+        db.commit()
+
+    return len(updates)
+
+
 @router.post("/sync-ipfs-from-pinata", response_model=MessageResponse)
 async def sync_ipfs_from_pinata(
+    request: Request,
     db: Session = Depends(get_db),
     _: bool = Depends(verify_admin)
 ):
@@ -155,82 +362,74 @@ async def sync_ipfs_from_pinata(
             detail="Pinata JWT not configured"
         )
 
-    # Fetch all pinned files from Pinata
-    async with httpx.AsyncClient() as client:
-        response = await client.get(
-            "https://api.pinata.cloud/data/pinList",
-            params={"status": "pinned", "pageLimit": 1000},
-            headers={"Authorization": f"Bearer {settings.pinata_jwt}"},
-            timeout=30.0
-        )
-        if response.status_code != 200:
-            raise HTTPException(
-                status_code=status.HTTP_502_BAD_GATEWAY,
-                detail=f"Failed to fetch from Pinata: {response.text}"
-            )
-        pinata_data = response.json()
+    # Fetch all pinned files from Pinata, paginated (one request only
+    # covers 1000 pins). The first page tells us the total count, then
+    # the remaining pages are fetched concurrently.
+    headers = {"Authorization": f"Bearer {settings.pinata_jwt}"}
+    # Shared keep-alive client from app lifespan, no per-call TLS handshake
+    client = request.app.state.http
 
-    # Build mapping of flag_id -> ipfs_hash for images and metadata
+    # Build mapping of flag_id -> ipfs_hash for images and metadata.
+    # Each page is classified as it arrives so the full pin list is
+    # never held in memory.
     # Priority: {COUNTRY}_{city}_{id}.png > flag_{id}.png
     image_map = {}  # {flag_id: ipfs_hash}
     image_map_fallback = {}  # {flag_id: ipfs_hash} for flag_{id}.png pattern
     metadata_map = {}  # {flag_id: ipfs_hash}
 
-    for pin in pinata_data.get("rows", []):
-        name = pin.get("metadata", {}).get("name", "")
-        ipfs_hash = pin.get("ipfs_pin_hash")
-
-        if not name or not ipfs_hash:
-            continue
-
-        # Match PRIMARY image files: {COUNTRY_CODE}_{municipality}_{flag_id}.png
-        # e.g., ITA_siena_064.png, ESP_barcelona_001.png - the number is the flag ID
-        match = re.match(r"^[A-Z]{3}_[a-z]+_(\d+)\.png$", name)
-        if match:
-            flag_id = int(match.group(1))
-            image_map[flag_id] = ipfs_hash
-            continue
-
-        # Match FALLBACK: flag_{id}.png format (lower priority)
-        match = re.match(r"^flag_(\d+)\.png$", name)
-        if match:
-            flag_id = int(match.group(1))
-            image_map_fallback[flag_id] = ipfs_hash
-            continue
-
-        # Match metadata files: flag_{id}_metadata.json
-        match = re.match(r"^flag_(\d+)_metadata\.json$", name)
-        if match:
-            flag_id = int(match.group(1))
-            metadata_map[flag_id] = ipfs_hash
+    response = await client.get(
+        PINATA_PIN_LIST_URL,
+        params={"status": "pinned", "pageLimit": PINATA_PAGE_LIMIT, "pageOffset": 0},
+        headers=headers,
+        timeout=30.0
+    )
+    if response.status_code != 200:
+        raise HTTPException(
+            status_code=status.HTTP_502_BAD_GATEWAY,
+            detail=f"Failed to fetch from Pinata: {response.text}"
+        )
+    # orjson decodes the multi-MB pin list noticeably faster than the
+    # stdlib parser behind response.json()
+    pinata_data = orjson.loads(response.content)
+    pins = pinata_data.get("rows", [])
+    _classify_pins(pins, image_map, image_map_fallback, metadata_map)
+
+    total_pins = pinata_data.get("count", len(pins))
+    if total_pins > PINATA_PAGE_LIMIT:
+        extra_responses = await asyncio.gather(*(
+            client.get(
+                PINATA_PIN_LIST_URL,
+                params={
+                    "status": "pinned",
+                    "pageLimit": PINATA_PAGE_LIMIT,
+                    "pageOffset": offset
+                },
+                headers=headers,
+                timeout=30.0
+            )
+            for offset in range(PINATA_PAGE_LIMIT, total_pins, PINATA_PAGE_LIMIT)
+        ))
+        for extra in extra_responses:
+            if extra.status_code != 200:
+                raise HTTPException(
+                    status_code=status.HTTP_502_BAD_GATEWAY,
+                    detail=f"Failed to fetch from Pinata: {extra.text}"
+                )
+            _classify_pins(
+                orjson.loads(extra.content).get("rows", []),
+                image_map, image_map_fallback, metadata_map
+            )
 
     # Merge fallback into main map (only if not already present)
     for flag_id, ipfs_hash in image_map_fallback.items():
         if flag_id not in image_map:
             image_map[flag_id] = ipfs_hash
 
-    # Get all flags
-    flags = db.query(Flag).all()
-
-    updated_count = 0
-
-    for flag in flags:
-        # Find matching image and metadata by flag ID
-        image_hash = image_map.get(flag.id)
-        metadata_hash = metadata_map.get(flag.id)
-
-        updated = False
-        if image_hash and flag.image_ipfs_hash != image_hash:
-            flag.image_ipfs_hash = image_hash
-            updated = True
-        if metadata_hash and flag.metadata_ipfs_hash != metadata_hash:
-            flag.metadata_ipfs_hash = metadata_hash
-            updated = True
-
-        if updated:
-            updated_count += 1
-
-    db.commit()
+    # The queries and commit below are synchronous - run them in a worker
+    # thread so the event loop keeps serving other requests meanwhile
+    updated_count = await anyio.to_thread.run_sync(
+        _apply_ipfs_updates, db, image_map, metadata_map
+    )
 
     return MessageResponse(
         message=f"Synced IPFS hashes. Updated {updated_count} flags. "
@@ -18,12 +18,20 @@ Implementation:
 
 The total cost is calculated as: price * nfts_required
 """
+import threading
 from decimal import Decimal
 from sqlalchemy.orm import Session
 from models import Country, Region, Municipality, Flag, FlagCategory
 from config import settings
 
 
+# Guards against concurrent seeding. The threading lock serializes the
+# in-process paths (the startup background task and the admin /seed
+# endpoint); the advisory-lock key covers multiple workers on Postgres.
+SEED_LOCK_KEY = 824_117_301
+seed_lock = threading.Lock()
+
+
 def get_nfts_required_for_category(category: FlagCategory) -> int:
     """
     Determine how many NFTs are required based on flag category.